@@ -1,19 +1,26 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, func, tuple_
+from sqlalchemy.orm import selectinload
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
 import logging
-from app.core.database import get_db
-from app.core.dependencies import get_current_admin
-from app.core.security import get_password_hash, generate_random_password
+from app.core.database import get_db, engine
+from app.core.dependencies import get_current_admin, invalidate_user_cache
+from app.core.pagination import encode_cursor, decode_cursor
+from app.core.security import aget_password_hash, generate_random_password
 from app.models.models import User, UserRole
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
+# INSERT с поддержкой ON CONFLICT для используемой СУБД
+dialect_insert = postgresql_insert if engine.dialect.name == "postgresql" else sqlite_insert
+
 
 class CreateUserRequest(BaseModel):
     """Запрос на создание пользователя"""
@@ -43,6 +50,7 @@ class UsersListResponse(BaseModel):
     total: int
     page: int
     page_size: int
+    next_cursor: Optional[str] = None  # Курсор следующей страницы (keyset-пагинация)
 
 
 class UpdateUserRequest(BaseModel):
@@ -69,40 +77,39 @@ async def create_user(
     Returns:
         CreateUserResponse: Данные созданного пользователя с временным паролем
     """
-    # Проверка существования пользователя
-    result = await db.execute(
-        select(User).where(User.username == user_data.username)
+    # Генерация случайного пароля
+    random_password = generate_random_password()
+    hashed_password = await aget_password_hash(random_password)
+    
+    # Создание пользователя одним запросом (ON CONFLICT вместо проверки перед вставкой)
+    stmt = (
+        dialect_insert(User)
+        .values(
+            username=user_data.username,
+            hashed_password=hashed_password,
+            role=user_data.role
+        )
+        .on_conflict_do_nothing(index_elements=[User.username])
+        .returning(User.id)
     )
-    existing_user = result.scalar_one_or_none()
+    result = await db.execute(stmt)
+    new_user_id = result.scalar_one_or_none()
     
-    if existing_user:
+    if new_user_id is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Пользователь с таким именем уже существует"
         )
     
-    # Генерация случайного пароля
-    random_password = generate_random_password()
-    hashed_password = get_password_hash(random_password)
-    
-    # Создание пользователя
-    new_user = User(
-        username=user_data.username,
-        hashed_password=hashed_password,
-        role=user_data.role
-    )
-    
-    db.add(new_user)
     await db.commit()
-    await db.refresh(new_user)
     
-    logger.info(f"Создан новый пользователь: {new_user.username} (role: {new_user.role})")
+    logger.info(f"Создан новый пользователь: {user_data.username} (role: {user_data.role})")
     
     return CreateUserResponse(
-        id=new_user.id,
-        username=new_user.username,
+        id=new_user_id,
+        username=user_data.username,
         password=random_password,
-        role=new_user.role.value
+        role=user_data.role.value
     )
 
 
@@ -110,6 +117,7 @@ async def create_user(
 async def list_users(
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
     db: AsyncSession = Depends(get_db),
     _: User = Depends(get_current_admin)
 ):
@@ -117,28 +125,49 @@ async def list_users(
     Получение списка всех пользователей (только для админа)
     
     Args:
-        page: Номер страницы
+        page: Номер страницы (используется, если не передан cursor)
         page_size: Размер страницы
+        cursor: Курсор следующей страницы из предыдущего ответа
         db: Сессия базы данных
         _: Текущий администратор (проверка прав)
         
     Returns:
         UsersListResponse: Список пользователей с пагинацией
     """
-    # Подсчёт общего количества
-    count_result = await db.execute(select(func.count(User.id)))
-    total = count_result.scalar()
+    # Общее количество считается подзапросом в том же запросе, что и страница
+    count_query = select(func.count(User.id))
     
-    # Пагинация
-    offset = (page - 1) * page_size
-    query = select(User).order_by(User.created_at.desc()).offset(offset).limit(page_size)
+    # Пагинация (лишняя запись показывает наличие следующей страницы)
+    query = (
+        select(User, count_query.scalar_subquery().label("total"))
+        .order_by(User.created_at.desc(), User.id.desc())
+        .limit(page_size + 1)
+    )
+    if cursor:
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        query = query.where(tuple_(User.created_at, User.id) < (cursor_created_at, cursor_id))
+    else:
+        query = query.offset((page - 1) * page_size)
     
     result = await db.execute(query)
-    users = result.scalars().all()
+    rows = result.all()
+    users = [row.User for row in rows]
+    
+    if rows:
+        total = rows[0].total
+    else:
+        # Пустая страница: общее количество запрашивается отдельно
+        total = (await db.execute(count_query)).scalar()
+    
+    next_cursor = None
+    if len(users) > page_size:
+        users = users[:page_size]
+        next_cursor = encode_cursor(users[-1].created_at, users[-1].id)
     
+    # Данные из БД доверенные: элементы списка создаются без повторной валидации
     return UsersListResponse(
         users=[
-            UserListItem(
+            UserListItem.model_construct(
                 id=u.id,
                 username=u.username,
                 role=u.role.value,
@@ -147,7 +176,8 @@ async def list_users(
         ],
         total=total,
         page=page,
-        page_size=page_size
+        page_size=page_size,
+        next_cursor=next_cursor
     )
 
 
@@ -184,13 +214,18 @@ async def update_user(
             detail="Нельзя изменить собственную роль"
         )
     
+    # Прежний username — ключ кэша, сбрасываемого после commit
+    old_username = user.username
+    
     # Обновление данных
     if user_data.username:
         # Проверка уникальности username
         check_result = await db.execute(
-            select(User).where(User.username == user_data.username, User.id != user_id)
+            select(User.id)
+            .where(User.username == user_data.username, User.id != user_id)
+            .limit(1)
         )
-        if check_result.scalar_one_or_none():
+        if check_result.scalar() is not None:
             raise HTTPException(
                 status_code=400,
                 detail="Пользователь с таким именем уже существует"
@@ -201,9 +236,10 @@ async def update_user(
         user.role = user_data.role
     
     if user_data.password:
-        user.hashed_password = get_password_hash(user_data.password)
+        user.hashed_password = await aget_password_hash(user_data.password)
     
     await db.commit()
+    invalidate_user_cache(old_username)
     
     logger.info(f"Обновлён пользователь: {user.username}")
     
@@ -227,8 +263,10 @@ async def delete_user(
     Returns:
         dict: Сообщение об успешном удалении
     """
-    # Получение пользователя
-    result = await db.execute(select(User).where(User.id == user_id))
+    # Получение пользователя вместе с файлами (нужны для каскадного удаления)
+    result = await db.execute(
+        select(User).options(selectinload(User.files)).where(User.id == user_id)
+    )
     user = result.scalar_one_or_none()
     
     if not user:
@@ -244,6 +282,7 @@ async def delete_user(
     # Удаление пользователя (файлы удалятся каскадно)
     await db.delete(user)
     await db.commit()
+    invalidate_user_cache(user.username)
     
     logger.info(f"Удалён пользователь: {user.username}")
     
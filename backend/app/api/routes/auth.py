@@ -4,7 +4,13 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from pydantic import BaseModel
 from app.core.database import get_db
-from app.core.security import verify_password, create_access_token
+from app.core.security import (
+    averify_password,
+    get_password_hash,
+    aget_password_hash,
+    password_needs_rehash,
+    create_access_token,
+)
 from app.core.dependencies import get_current_user
 from app.models.models import User
 import logging
@@ -13,6 +19,10 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
+# Хеш для проверки пароля несуществующего пользователя:
+# время ответа не должно выдавать наличие логина
+_DUMMY_HASH = get_password_hash("dummy-password")
+
 
 class TokenResponse(BaseModel):
     """Ответ с токеном"""
@@ -48,8 +58,11 @@ async def login(
     result = await db.execute(select(User).where(User.username == form_data.username))
     user = result.scalar_one_or_none()
     
-    # Проверка пароля
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    # Проверка пароля (выполняется и для несуществующего пользователя)
+    hashed_password = user.hashed_password if user else _DUMMY_HASH
+    password_valid = await averify_password(form_data.password, hashed_password)
+    
+    if not user or not password_valid:
         logger.warning(f"Неудачная попытка входа: {form_data.username}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -57,6 +70,12 @@ async def login(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Обновление устаревшего хеша пароля
+    if password_needs_rehash(user.hashed_password):
+        user.hashed_password = await aget_password_hash(form_data.password)
+        await db.commit()
+        logger.info(f"Хеш пароля обновлён: {user.username}")
+    
     # Создание токена
     access_token = create_access_token(data={"sub": user.username})
     
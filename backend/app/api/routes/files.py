@@ -2,26 +2,35 @@
 Маршруты работы с файлами
 """
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query
-from fastapi.responses import FileResponse as StarletteFileResponse
+from fastapi.responses import FileResponse as StarletteFileResponse, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, delete, func, tuple_
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 from pathlib import Path
 from datetime import datetime
-import uuid
+from urllib.parse import quote
+import io
 import os
+import secrets
 import logging
+import aiofiles
 from app.core.database import get_db
 from app.core.dependencies import get_current_user, get_current_admin
-from app.core.config import settings
-from app.models.models import User, CalculationFile
+from app.core.pagination import encode_cursor, decode_cursor
+from app.core.config import Settings, get_settings
+from app.models.models import User, UserRole, CalculationFile
 from app.services.calculator import calculator_service
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/files", tags=["files"])
 
+# Размер блока при потоковом сохранении загружаемого файла
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
 
 class FileResponseModel(BaseModel):
     """Ответ с информацией о файле"""
@@ -38,13 +47,15 @@ class FilesListResponse(BaseModel):
     total: int
     page: int
     page_size: int
+    next_cursor: Optional[str] = None  # Курсор следующей страницы (keyset-пагинация)
 
 
 @router.post("/upload")
 async def upload_file(
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    settings: Settings = Depends(get_settings)
 ):
     """
     Загрузка и обработка файла
@@ -53,6 +64,7 @@ async def upload_file(
         file: Загружаемый файл
         current_user: Текущий пользователь
         db: Сессия базы данных
+        settings: Настройки приложения
         
     Returns:
         dict: Информация об обработанном файле
@@ -70,45 +82,42 @@ async def upload_file(
             detail="Поддерживаются только файлы .txt и .xlsx"
         )
     
-    # Проверка размера
-    content = await file.read()
-    file_size = len(content)
-    
-    if file_size > settings.MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Файл слишком большой. Максимальный размер: {settings.MAX_FILE_SIZE / 1024 / 1024} МБ"
-        )
-    
     # Создание временного файла для обработки
-    temp_path = Path(settings.STORAGE_PATH) / f"temp_{uuid.uuid4()}{file_extension}"
+    temp_path = Path(settings.STORAGE_PATH) / f"temp_{secrets.token_urlsafe(12)}{file_extension}"
     temp_path.parent.mkdir(parents=True, exist_ok=True)
     
     try:
-        # Сохранение временного файла
-        with open(temp_path, 'wb') as f:
-            f.write(content)
+        # Потоковое сохранение временного файла с проверкой размера
+        file_size = 0
+        async with aiofiles.open(temp_path, 'wb') as f:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                file_size += len(chunk)
+                if file_size > settings.MAX_FILE_SIZE:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Файл слишком большой. Максимальный размер: {settings.MAX_FILE_SIZE / 1024 / 1024} МБ"
+                    )
+                await f.write(chunk)
         
         # Обработка файла
-        if file_extension == '.txt':
-            df = await calculator_service.process_file(
-                temp_path, 
-                file_extension,
-                content=content.decode('utf-8')
-            )
-        else:
-            df = await calculator_service.process_file(temp_path, file_extension)
+        df = await calculator_service.process_file(temp_path, file_extension)
         
         # Генерация уникального имени выходного файла
         timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
         original_name = Path(file.filename).stem
-        unique_id = str(uuid.uuid4())[:8]
+        unique_id = secrets.token_urlsafe(6)
         output_filename = f"{timestamp}_АвтоРасчет_{original_name}_{unique_id}.xlsx"
         output_path = Path(settings.STORAGE_PATH) / output_filename
         
-        # Сохранение результата
-        df.to_excel(output_path, index=False)
-        output_size = output_path.stat().st_size
+        # Сохранение результата (размер известен из буфера, без stat())
+        # xlsxwriter быстрее openpyxl; constant_memory не используется,
+        # так как pandas пишет ячейки по столбцам и данные теряются
+        buffer = io.BytesIO()
+        df.to_excel(buffer, index=False, engine='xlsxwriter')
+        data = buffer.getvalue()
+        output_size = len(data)
+        async with aiofiles.open(output_path, 'wb') as f:
+            await f.write(data)
         
         # Сохранение в БД
         calc_file = CalculationFile(
@@ -134,6 +143,8 @@ async def upload_file(
             }
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Ошибка обработки файла: {str(e)}", exc_info=True)
         raise HTTPException(
@@ -150,6 +161,7 @@ async def upload_file(
 async def list_files(
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -157,8 +169,9 @@ async def list_files(
     Получение списка файлов пользователя
     
     Args:
-        page: Номер страницы
+        page: Номер страницы (используется, если не передан cursor)
         page_size: Размер страницы
+        cursor: Курсор следующей страницы из предыдущего ответа
         current_user: Текущий пользователь
         db: Сессия базы данных
         
@@ -166,27 +179,46 @@ async def list_files(
         FilesListResponse: Список файлов с пагинацией
     """
     # Фильтр по пользователю (админ видит все файлы)
-    query = select(CalculationFile)
     count_query = select(func.count(CalculationFile.id))
-    
     if current_user.role.value != "admin":
-        query = query.where(CalculationFile.user_id == current_user.id)
         count_query = count_query.where(CalculationFile.user_id == current_user.id)
     
-    # Подсчёт общего количества
-    total_result = await db.execute(count_query)
-    total = total_result.scalar()
+    # Общее количество считается подзапросом в том же запросе, что и страница
+    query = select(CalculationFile, count_query.scalar_subquery().label("total"))
+    if current_user.role.value != "admin":
+        query = query.where(CalculationFile.user_id == current_user.id)
     
-    # Пагинация
-    offset = (page - 1) * page_size
-    query = query.order_by(CalculationFile.created_at.desc()).offset(offset).limit(page_size)
+    # Пагинация (лишняя запись показывает наличие следующей страницы)
+    query = query.order_by(
+        CalculationFile.created_at.desc(), CalculationFile.id.desc()
+    ).limit(page_size + 1)
+    if cursor:
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        query = query.where(
+            tuple_(CalculationFile.created_at, CalculationFile.id) < (cursor_created_at, cursor_id)
+        )
+    else:
+        query = query.offset((page - 1) * page_size)
     
     result = await db.execute(query)
-    files = result.scalars().all()
+    rows = result.all()
+    files = [row.CalculationFile for row in rows]
+    
+    if rows:
+        total = rows[0].total
+    else:
+        # Пустая страница: общее количество запрашивается отдельно
+        total = (await db.execute(count_query)).scalar()
     
+    next_cursor = None
+    if len(files) > page_size:
+        files = files[:page_size]
+        next_cursor = encode_cursor(files[-1].created_at, files[-1].id)
+    
+    # Данные из БД доверенные: элементы списка создаются без повторной валидации
     return FilesListResponse(
         files=[
-            FileResponseModel(
+            FileResponseModel.model_construct(
                 id=f.id,
                 filename=f.filename,
                 original_filename=f.original_filename,
@@ -196,7 +228,8 @@ async def list_files(
         ],
         total=total,
         page=page,
-        page_size=page_size
+        page_size=page_size,
+        next_cursor=next_cursor
     )
 
 
@@ -204,7 +237,8 @@ async def list_files(
 async def download_file(
     file_id: int,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    settings: Settings = Depends(get_settings)
 ):
     """
     Скачивание файла
@@ -213,23 +247,23 @@ async def download_file(
         file_id: ID файла
         current_user: Текущий пользователь
         db: Сессия базы данных
+        settings: Настройки приложения
         
     Returns:
-        FileResponse: Файл для скачивания
+        Response: Файл для скачивания (за nginx — через X-Accel-Redirect)
     """
-    # Получение файла
-    result = await db.execute(
-        select(CalculationFile).where(CalculationFile.id == file_id)
-    )
+    # Получение файла с проверкой прав доступа в том же запросе
+    query = select(CalculationFile).where(CalculationFile.id == file_id)
+    if current_user.role != UserRole.ADMIN:
+        query = query.where(CalculationFile.user_id == current_user.id)
+    
+    result = await db.execute(query)
     calc_file = result.scalar_one_or_none()
     
+    # Чужой файл для пользователя неотличим от несуществующего
     if not calc_file:
         raise HTTPException(status_code=404, detail="Файл не найден")
     
-    # Проверка прав доступа
-    if current_user.role.value != "admin" and calc_file.user_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Нет доступа к файлу")
-    
     # Проверка существования файла
     file_path = Path(calc_file.file_path)
     if not file_path.exists():
@@ -237,10 +271,21 @@ async def download_file(
     
     logger.info(f"Пользователь {current_user.username} скачивает файл: {calc_file.filename}")
     
+    # Отдача файла средствами nginx (sendfile) без передачи данных через Python
+    if settings.USE_X_ACCEL_REDIRECT:
+        quoted_filename = quote(calc_file.filename)
+        return Response(
+            media_type=XLSX_MEDIA_TYPE,
+            headers={
+                "X-Accel-Redirect": f"{settings.X_ACCEL_REDIRECT_PREFIX}{quoted_filename}",
+                "Content-Disposition": f"attachment; filename*=utf-8''{quoted_filename}",
+            }
+        )
+    
     return StarletteFileResponse(
         path=str(file_path),
         filename=calc_file.filename,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        media_type=XLSX_MEDIA_TYPE
     )
 
 
@@ -261,28 +306,26 @@ async def delete_file(
     Returns:
         dict: Сообщение об успешном удалении
     """
-    # Получение файла
-    result = await db.execute(
-        select(CalculationFile).where(CalculationFile.id == file_id)
-    )
-    calc_file = result.scalar_one_or_none()
+    # Удаление из БД с проверкой прав доступа в том же запросе
+    stmt = delete(CalculationFile).where(CalculationFile.id == file_id)
+    if current_user.role != UserRole.ADMIN:
+        stmt = stmt.where(CalculationFile.user_id == current_user.id)
+    stmt = stmt.returning(CalculationFile.file_path, CalculationFile.filename)
     
-    if not calc_file:
+    result = await db.execute(stmt)
+    deleted = result.one_or_none()
+    
+    # Чужой файл для пользователя неотличим от несуществующего
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Файл не найден")
     
-    # Проверка прав доступа
-    if current_user.role.value != "admin" and calc_file.user_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Нет доступа к файлу")
+    await db.commit()
     
     # Удаление файла с диска
-    file_path = Path(calc_file.file_path)
+    file_path = Path(deleted.file_path)
     if file_path.exists():
         file_path.unlink()
     
-    # Удаление из БД
-    await db.delete(calc_file)
-    await db.commit()
-    
-    logger.info(f"Пользователь {current_user.username} удалил файл: {calc_file.filename}")
+    logger.info(f"Пользователь {current_user.username} удалил файл: {deleted.filename}")
     
     return {"message": "Файл успешно удалён"}
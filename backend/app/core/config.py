@@ -1,4 +1,5 @@
 from pydantic_settings import BaseSettings
+from functools import lru_cache
 from typing import Literal
 
 
@@ -14,9 +15,14 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "your"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_HOURS: int = 24
+    USER_CACHE_TTL_SECONDS: int = 60  # Время жизни кэша пользователей
     
     # База данных
     DATABASE_URL: str = "sqlite+aiosqlite:///./vedo.db"
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 40
+    DB_POOL_RECYCLE: int = 1800  # секунд
+    DB_ECHO: bool = False  # Логирование SQL-запросов
     
     # Администратор по умолчанию
     ADMIN_USERNAME: str = "admin"
@@ -27,6 +33,10 @@ class Settings(BaseSettings):
     MAX_FILE_SIZE: int = 20 * 1024 * 1024  # 20 МБ
     FILE_RETENTION_DAYS: int = 7
     
+    # Отдача файлов через nginx (X-Accel-Redirect)
+    USE_X_ACCEL_REDIRECT: bool = False
+    X_ACCEL_REDIRECT_PREFIX: str = "/protected/"
+    
     # Логирование
     LOG_LEVEL: str = "INFO"
     LOG_FILE: str = "../logs/app.log"
@@ -50,4 +60,15 @@ class Settings(BaseSettings):
         case_sensitive = True
 
 
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    Получение настроек приложения (создаются один раз)
+    
+    Returns:
+        Settings: Настройки приложения
+    """
+    return Settings()
+
+
+settings = get_settings()
@@ -1,13 +1,27 @@
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 from app.core.config import settings
 
 
+# Параметры пула соединений (SQLite через aiosqlite работает без пула)
+pool_options = {}
+if not settings.DATABASE_URL.startswith("sqlite"):
+    pool_options = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_pre_ping": True,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_use_lifo": True,  # Повторное использование "тёплых" соединений
+    }
+
 # Создание async engine
 engine = create_async_engine(
     settings.DATABASE_URL,
-    echo=settings.ENVIRONMENT == "development",
+    echo=settings.DB_ECHO,
     future=True,
+    query_cache_size=1200,  # Кэш скомпилированных SQL-выражений
+    **pool_options,
 )
 
 # Создание фабрики сессий
@@ -29,23 +43,48 @@ async def get_db() -> AsyncSession:
     """
     Dependency для получения сессии базы данных
     
+    Изменяющие маршруты фиксируют транзакцию сами, поэтому
+    для запросов на чтение commit не выполняется.
+    
     Yields:
         AsyncSession: Асинхронная сессия SQLAlchemy
     """
     async with AsyncSessionLocal() as session:
         try:
             yield session
-            await session.commit()
         except Exception:
             await session.rollback()
             raise
-        finally:
-            await session.close()
 
 
 async def init_db() -> None:
     """
-    Инициализация базы данных: создание всех таблиц
+    Инициализация базы данных: создание всех таблиц и недостающих индексов
     """
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_create_missing_indexes)
+        await conn.run_sync(_drop_obsolete_indexes)
+
+
+def _create_missing_indexes(conn) -> None:
+    """
+    Создание индексов, добавленных после создания таблиц
+    (create_all не трогает уже существующие таблицы)
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+# Индексы прежних версий схемы, перекрытые ix_calc_files_cleanup
+_OBSOLETE_INDEXES = ("ix_calculation_files_created_at",)
+
+
+def _drop_obsolete_indexes(conn) -> None:
+    """
+    Удаление индексов, избыточных для текущей схемы
+    (каждый лишний индекс замедляет вставку при загрузке файлов)
+    """
+    for index_name in _OBSOLETE_INDEXES:
+        conn.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
@@ -1,7 +1,9 @@
 from fastapi import Depends, HTTPException, status, Cookie
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import Optional
+from typing import Dict, Optional
+from cachetools import TTLCache
+from app.core.config import settings
 from app.core.database import get_db
 from app.core.security import decode_access_token
 from app.models.models import User, UserRole
@@ -9,6 +11,26 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Кэш аутентифицированных пользователей (username -> User)
+_user_cache: TTLCache = TTLCache(maxsize=10_000, ttl=settings.USER_CACHE_TTL_SECONDS)
+
+# Поколение инвалидации для каждого username (растёт при каждом сбросе)
+_user_generations: Dict[str, int] = {}
+
+
+def invalidate_user_cache(username: str) -> None:
+    """
+    Удаление пользователя из кэша (после изменения или удаления)
+    
+    Запросы, начавшие чтение пользователя до сброса, не сохранят
+    прочитанную строку в кэш (см. get_current_user).
+    
+    Args:
+        username: Имя пользователя
+    """
+    _user_generations[username] = _user_generations.get(username, 0) + 1
+    _user_cache.pop(username, None)
+
 
 async def get_current_user(
     access_token: Optional[str] = Cookie(None),
@@ -44,12 +66,21 @@ async def get_current_user(
     if username is None:
         raise credentials_exception
     
-    # Получение пользователя из БД
-    result = await db.execute(select(User).where(User.username == username))
-    user = result.scalar_one_or_none()
-    
+    # Получение пользователя из кэша или БД
+    user = _user_cache.get(username)
     if user is None:
-        raise credentials_exception
+        generation = _user_generations.get(username, 0)
+        result = await db.execute(select(User).where(User.username == username))
+        user = result.scalar_one_or_none()
+        
+        if user is None:
+            raise credentials_exception
+        
+        # Отсоединение от сессии: откат транзакции не должен сбрасывать атрибуты
+        db.expunge(user)
+        # Если во время запроса кэш сбросили, строка могла устареть — не кэшируем
+        if _user_generations.get(username, 0) == generation:
+            _user_cache[username] = user
     
     return user
 
@@ -0,0 +1,43 @@
+from datetime import datetime
+from typing import Tuple
+from fastapi import HTTPException, status
+import base64
+import json
+
+
+def encode_cursor(created_at: datetime, item_id: int) -> str:
+    """
+    Кодирование курсора keyset-пагинации
+
+    Args:
+        created_at: Дата создания последней записи страницы
+        item_id: ID последней записи страницы
+
+    Returns:
+        str: Курсор в формате base64 (JSON)
+    """
+    payload = json.dumps({"created_at": created_at.isoformat(), "id": item_id})
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Декодирование курсора keyset-пагинации
+
+    Args:
+        cursor: Курсор, полученный от клиента
+
+    Returns:
+        tuple: Дата создания и ID последней записи предыдущей страницы
+
+    Raises:
+        HTTPException: Если курсор некорректный
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(payload["created_at"]), int(payload["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректный курсор пагинации"
+        )
@@ -1,20 +1,30 @@
-from datetime import datetime, timedelta
+from datetime import timedelta
 from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from concurrent.futures import ThreadPoolExecutor
+from argon2 import PasswordHasher
+from argon2.exceptions import VerificationError, InvalidHashError
 from app.core.config import settings
+import asyncio
+import bcrypt
+import jwt
+import os
 import secrets
-import string
+import time
 
 
-# Контекст для хеширования паролей
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Хешер паролей (argon2id)
+password_hasher = PasswordHasher(time_cost=2, memory_cost=65536, parallelism=1)
+
+# Пул потоков для хеширования (ограничивает параллелизм и расход памяти argon2)
+_hash_executor = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="password_hash")
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     Проверка пароля
     
+    Поддерживает старые bcrypt-хеши, созданные до перехода на argon2.
+    
     Args:
         plain_password: Пароль в открытом виде
         hashed_password: Хешированный пароль
@@ -22,7 +32,28 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     Returns:
         bool: True если пароль верный
     """
-    return pwd_context.verify(plain_password, hashed_password)
+    if hashed_password.startswith("$2"):
+        return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
+    
+    try:
+        return password_hasher.verify(hashed_password, plain_password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """
+    Проверка необходимости перехеширования пароля
+    
+    Args:
+        hashed_password: Хешированный пароль
+        
+    Returns:
+        bool: True если хеш устарел (bcrypt или другие параметры argon2)
+    """
+    if not hashed_password.startswith("$argon2"):
+        return True
+    return password_hasher.check_needs_rehash(hashed_password)
 
 
 def get_password_hash(password: str) -> str:
@@ -35,7 +66,36 @@ def get_password_hash(password: str) -> str:
     Returns:
         str: Хешированный пароль
     """
-    return pwd_context.hash(password)
+    return password_hasher.hash(password)
+
+
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    """
+    Проверка пароля в пуле потоков (не блокирует event loop)
+    
+    Args:
+        plain_password: Пароль в открытом виде
+        hashed_password: Хешированный пароль
+        
+    Returns:
+        bool: True если пароль верный
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, verify_password, plain_password, hashed_password)
+
+
+async def aget_password_hash(password: str) -> str:
+    """
+    Хеширование пароля в пуле потоков (не блокирует event loop)
+    
+    Args:
+        password: Пароль в открытом виде
+        
+    Returns:
+        str: Хешированный пароль
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, get_password_hash, password)
 
 
 def generate_random_password(length: int = 12) -> str:
@@ -48,9 +108,8 @@ def generate_random_password(length: int = 12) -> str:
     Returns:
         str: Случайный пароль
     """
-    alphabet = string.ascii_letters + string.digits + "!@#$%^&*"
-    password = ''.join(secrets.choice(alphabet) for _ in range(length))
-    return password
+    # Одно чтение os.urandom вместо вызова secrets.choice на каждый символ
+    return secrets.token_urlsafe(length)[:length]
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -64,13 +123,12 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     Returns:
         str: JWT токен
     """
-    to_encode = data.copy()
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        lifetime = int(expires_delta.total_seconds())
     else:
-        expire = datetime.utcnow() + timedelta(hours=settings.ACCESS_TOKEN_EXPIRE_HOURS)
+        lifetime = settings.ACCESS_TOKEN_EXPIRE_HOURS * 3600
     
-    to_encode.update({"exp": expire})
+    to_encode = {**data, "exp": int(time.time()) + lifetime}
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
@@ -88,5 +146,5 @@ def decode_access_token(token: str) -> Optional[dict]:
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         return payload
-    except JWTError:
+    except jwt.PyJWTError:
         return None
@@ -3,18 +3,29 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from pathlib import Path
+import asyncio
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 from app.core.config import settings
 from app.core.database import init_db
 from app.api.routes import auth, files, admin
 from app.services.scheduler import start_scheduler, stop_scheduler
 from app.services.init_admin import init_default_admin
+from app.services.calculator import calculator_service
 
 
 # Настройка логирования
-def setup_logging():
-    """Настройка логирования приложения"""
+def setup_logging() -> QueueListener:
+    """
+    Настройка логирования приложения
+    
+    Записи передаются через очередь в фоновый поток, где выполняются
+    форматирование и запись в файл/консоль.
+    
+    Returns:
+        QueueListener: Запущенный обработчик очереди логов
+    """
     log_path = Path(settings.LOG_FILE)
     log_path.parent.mkdir(parents=True, exist_ok=True)
     
@@ -39,14 +50,20 @@ def setup_logging():
     console_handler.setFormatter(log_format)
     console_handler.setLevel(logging.INFO)
     
+    # Очередь логов: в потоке запроса выполняется только queue.put
+    log_queue = queue.Queue(-1)
+    listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    
     # Корневой logger
     root_logger = logging.getLogger()
     root_logger.setLevel(logging.INFO)
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(console_handler)
+    root_logger.addHandler(QueueHandler(log_queue))
+    
+    return listener
 
 
-setup_logging()
+log_listener = setup_logging()
 logger = logging.getLogger(__name__)
 
 
@@ -71,6 +88,10 @@ async def lifespan(app: FastAPI):
     # Создание администратора по умолчанию
     await init_default_admin()
     
+    # Компиляция numba-функций расчёта до первого запроса
+    await asyncio.to_thread(calculator_service.warmup)
+    logger.info("Сервис расчёта подготовлен")
+    
     # Запуск планировщика задач
     start_scheduler()
     logger.info("Планировщик задач запущен")
@@ -83,6 +104,7 @@ async def lifespan(app: FastAPI):
     logger.info("Остановка приложения...")
     stop_scheduler()
     logger.info("Приложение остановлено")
+    log_listener.stop()
 
 
 # Создание FastAPI приложения
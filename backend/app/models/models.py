@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -22,8 +22,18 @@ class User(Base):
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
-    # Связь с файлами
-    files = relationship("CalculationFile", back_populates="owner", cascade="all, delete-orphan")
+    # Связь с файлами (загружается только явно через selectinload)
+    files = relationship(
+        "CalculationFile",
+        back_populates="owner",
+        cascade="all, delete-orphan",
+        lazy="raise"
+    )
+    
+    __table_args__ = (
+        # Keyset-пагинация списка пользователей
+        Index("ix_users_created_id", created_at.desc(), id.desc()),
+    )
     
     def __repr__(self) -> str:
         return f"<User(id={self.id}, username='{self.username}', role='{self.role}')>"
@@ -39,10 +49,18 @@ class CalculationFile(Base):
     file_path = Column(String(512), nullable=False)
     file_size = Column(Integer, nullable=False)  # в байтах
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    # Связь с пользователем (загружается только явно через selectinload)
+    owner = relationship("User", back_populates="files", lazy="raise")
     
-    # Связь с пользователем
-    owner = relationship("User", back_populates="files")
+    __table_args__ = (
+        # Список файлов пользователя: поиск по user_id без сортировки
+        Index("ix_calc_files_user_created", user_id, created_at.desc(), id.desc()),
+        # Очистка старых файлов (покрывающий индекс для index-only scan)
+        # и keyset-пагинация списка всех файлов (обратный проход)
+        Index("ix_calc_files_cleanup", created_at, id, file_path),
+    )
     
     def __repr__(self) -> str:
         return f"<CalculationFile(id={self.id}, filename='{self.filename}', user_id={self.user_id})>"
@@ -1,53 +1,139 @@
+import numba
+import numpy as np
 import pandas as pd
 import re
+from collections import Counter
 from datetime import datetime
 from pathlib import Path
-from typing import Union
+from typing import Tuple, Union
 import logging
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Порядок колонок результата расчёта
+RESULT_COLUMNS = [
+    'Наименование изделия', 'Ед. изм.', 'Количество', 'Ширина, м', 'Длина, м',
+    'Развертка, м', 'Общая площадь, м',
+    'Проекция, м', 'Площадь проекции, м',
+    'Тип формы', 'Отсечка', 'Тип отсечки'
+]
+
+
+# Последовательный проход с накоплением не векторизуется — компилируется numba
+@numba.njit(cache=True)
+def _pack_subgroups(
+    group_starts: np.ndarray,
+    counts: np.ndarray,
+    capacities: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Разбиение отсортированных строк на подгруппы (отсечки)
+    
+    Строки одной группы идут подряд. Новая подгруппа начинается при смене
+    группы или если количество изделий превысит вместимость формы.
+    
+    Args:
+        group_starts: Признак начала группы (Тип формы, ширина) для каждой строки
+        counts: Количество изделий в строке
+        capacities: Вместимость формы для каждой строки
+        
+    Returns:
+        tuple: Номер отсечки (с 1) и признак первой строки отсечки для каждой строки
+    """
+    n = counts.shape[0]
+    cutoff_ids = np.empty(n, dtype=np.int64)
+    is_first = np.zeros(n, dtype=np.bool_)
+    cutoff_id = 0
+    current_total = 0
+    
+    for i in range(n):
+        count = counts[i]
+        if group_starts[i] or current_total + count > capacities[i]:
+            cutoff_id += 1
+            current_total = 0
+            is_first[i] = True
+        cutoff_ids[i] = cutoff_id
+        current_total += count
+    
+    return cutoff_ids, is_first
+
 
 class CalculatorService:
     """Сервис для обработки файлов расчёта"""
     
-    def __init__(self):
-        # Вместимость форм из настроек
-        self.FORM_CAPACITY = {
-            1: settings.FORM_CAPACITY_1,
-            2: settings.FORM_CAPACITY_2,
-            3: settings.FORM_CAPACITY_3
-        }
-        # Типы отсечек из настроек
-        self.CUTOFF_TYPES = {
-            1: settings.CUTOFF_TYPE_1,
-            2: settings.CUTOFF_TYPE_2,
-            3: settings.CUTOFF_TYPE_3
-        }
+    # Формат названия изделия: name_WxLxP_F
+    _ITEM_RE = re.compile(r'^(\w+)_(\d+)x(\d+)x(\d+)_(\d+)')
+    
+    # Колонки входного XLSX (остальные колонки не читаются)
+    _XLSX_COLUMNS = frozenset({
+        'Наименование изделия', 'Ед. изм.', 'Кол-во', 'Количество',
+        'Ширина, м', 'Длина, м', 'Проекция, м', 'Тип формы'
+    })
+    
+    # Вместимость форм и типы отсечек из настроек в виде массивов
+    # с индексом по типу формы (индекс 0 не используется)
+    _CAP_LUT = np.array(
+        [0, settings.FORM_CAPACITY_1, settings.FORM_CAPACITY_2, settings.FORM_CAPACITY_3],
+        dtype=np.int32
+    )
+    _CUT_LUT = np.array(
+        [0, settings.CUTOFF_TYPE_1, settings.CUTOFF_TYPE_2, settings.CUTOFF_TYPE_3],
+        dtype=np.int32
+    )
+    _CAP_LUT.flags.writeable = False
+    _CUT_LUT.flags.writeable = False
+    
+    def warmup(self) -> None:
+        """
+        Предварительная компиляция numba-функций
+        
+        Вызывается при старте приложения, чтобы компиляция (или загрузка
+        из кэша) не выполнялась во время первого запроса.
+        Типы аргументов совпадают с вызовом в assign_cutoffs.
+        """
+        _pack_subgroups(
+            np.ones(1, dtype=np.bool_),
+            np.ones(1, dtype=np.int64),
+            np.ones(1, dtype=np.int64)
+        )
     
-    def parse_item_name(self, item_name: str) -> dict:
+    def _cast_form_types(self, form_types: pd.Series) -> pd.Series:
         """
-        Парсинг названия изделия
+        Проверка типов форм и приведение к int8
         
         Args:
-            item_name: Название в формате name_WxLxP_F
+            form_types: Колонка 'Тип формы'
             
         Returns:
-            dict: Словарь с параметрами изделия
+            Series: Типы форм в int8
+            
+        Raises:
+            ValueError: Если встречается неизвестный тип формы
         """
-        match = re.match(r'(\w+)_(\d+)x(\d+)x(\d+)_(\d+)', item_name)
-        if not match:
-            raise ValueError(f"Некорректный формат названия: {item_name}")
+        unknown = (form_types < 1) | (form_types >= len(self._CAP_LUT))
+        if unknown.any():
+            raise ValueError(f"Неизвестный тип формы: {sorted(form_types[unknown].unique().tolist())}")
+        return form_types.astype('int8')
+    
+    def _meters_to_mm(self, values: pd.Series) -> np.ndarray:
+        """
+        Перевод размеров из метров в целые миллиметры
         
-        name, width, length, projection, form_type = match.groups()
-        return {
-            'name': name,
-            'width_mm': int(width),
-            'length_mm': int(length),
-            'projection_mm': int(projection),
-            'form_type': int(form_type)
-        }
+        Args:
+            values: Колонка размеров в метрах
+            
+        Returns:
+            ndarray: Размеры в миллиметрах (int32)
+            
+        Raises:
+            ValueError: Если в колонке есть пустые или бесконечные значения
+        """
+        meters = values.to_numpy()
+        # astype(np.int32) молча превращает NaN в INT_MIN — проверка до приведения
+        if not np.isfinite(meters).all():
+            raise ValueError(f"Пустое или некорректное значение в колонке '{values.name}'")
+        return (meters * 1000).astype(np.int32)
     
     def parse_txt_file(self, content: str) -> pd.DataFrame:
         """
@@ -60,39 +146,54 @@ class CalculatorService:
             DataFrame: Датафрейм с данными
         """
         logger.info("Парсинг TXT файла")
-        items = []
-        lines = content.strip().split('\n')
-        for line in lines:
-            parts = line.strip().split()
-            items.extend(parts)
+        # Подсчёт одинаковых изделий (в порядке первого появления)
+        item_counts = Counter(content.split())
+        n = len(item_counts)
         
-        data = []
-        item_counts = {}
+        # Разбор названий за один проход в параллельные массивы
+        names = []
+        width_mm = np.empty(n, dtype=np.int32)
+        length_mm = np.empty(n, dtype=np.int32)
+        # Размеры в метрах округляются встроенным round(): np.round
+        # расходится с ним на половинных значениях (225 мм -> 0.22 вместо 0.23)
+        width_m = np.empty(n, dtype=np.float64)
+        length_m = np.empty(n, dtype=np.float64)
+        projection_m = np.empty(n, dtype=np.float64)
+        form_types = np.empty(n, dtype=np.int64)
+        counts = np.empty(n, dtype=np.int64)
         
-        for item in items:
-            item_counts[item] = item_counts.get(item, 0) + 1
+        # Метод сопоставления в локальной переменной — без поиска атрибутов в цикле
+        match_item = self._ITEM_RE.match
+        for i, (item, count) in enumerate(item_counts.items()):
+            match = match_item(item)
+            if match is None:
+                raise ValueError(f"Некорректный формат названия: {item}")
+            name, width, length, projection, form_type = match.groups()
+            width = int(width)
+            length = int(length)
+            names.append(f"{name}_{width}x{length}")
+            width_mm[i] = width
+            length_mm[i] = length
+            width_m[i] = round(width / 1000, 2)
+            length_m[i] = round(length / 1000, 2)
+            projection_m[i] = round(int(projection) / 1000, 2)
+            form_types[i] = int(form_type)
+            counts[i] = count
         
-        for item_name, count in item_counts.items():
-            parsed = self.parse_item_name(item_name)
-            width_m = parsed['width_mm'] / 1000
-            length_m = parsed['length_mm'] / 1000
-            projection_m = parsed['projection_mm'] / 1000
-            
-            record = {
-                'Наименование изделия': f"{parsed['name']}_{parsed['width_mm']}x{parsed['length_mm']}",
-                'Ед. изм.': 'шт.',
-                'Количество': count,
-                'Ширина, м': round(width_m, 2),
-                'Длина, м': round(length_m, 2),
-                'Проекция, м': round(projection_m, 2),
-                'Тип формы': parsed['form_type'],
-                'width_mm': parsed['width_mm'],
-                'length_mm': parsed['length_mm']
-            }
-            data.append(record)
+        df = pd.DataFrame({
+            'Наименование изделия': pd.array(names, dtype='string[pyarrow]'),
+            'Ед. изм.': pd.Categorical.from_codes(np.zeros(n, dtype=np.int8), ['шт.']),
+            'Количество': counts,
+            'Ширина, м': width_m,
+            'Длина, м': length_m,
+            'Проекция, м': projection_m,
+            'Тип формы': self._cast_form_types(pd.Series(form_types)),
+            'width_mm': width_mm,
+            'length_mm': length_mm
+        })
         
-        logger.info(f"Загружено из TXT: {len(data)} позиций")
-        return pd.DataFrame(data)
+        logger.info(f"Загружено из TXT: {len(df)} позиций")
+        return df
     
     def parse_xlsx_file(self, file_path: Path) -> pd.DataFrame:
         """
@@ -105,102 +206,94 @@ class CalculatorService:
             DataFrame: Датафрейм с данными
         """
         logger.info("Парсинг XLSX файла")
-        df = pd.read_excel(file_path)
-        df = df.copy()
-        df = df.rename(columns={'Кол-во': 'Количество'})
-        df['width_mm'] = (df['Ширина, м'] * 1000).astype(int)
-        df['length_mm'] = (df['Длина, м'] * 1000).astype(int)
-        
-        result = df[[
-            'Наименование изделия',
-            'Ед. изм.',
-            'Количество',
-            'Ширина, м',
-            'Длина, м',
-            'Проекция, м',
-            'Тип формы',
-            'width_mm',
-            'length_mm'
-        ]]
+        # calamine (Rust) вместо openpyxl; явные типы без автоопределения.
+        # Строки в Arrow, числовые колонки остаются NumPy (нужны numba без копий)
+        df = pd.read_excel(
+            file_path,
+            engine='calamine',
+            usecols=lambda column: column in self._XLSX_COLUMNS,
+            dtype={
+                'Наименование изделия': 'string[pyarrow]',
+                'Ед. изм.': 'category',
+                'Ширина, м': 'float64',
+                'Длина, м': 'float64',
+                'Проекция, м': 'float64',
+                'Тип формы': 'int64',  # int8 сразу при чтении молча переполняется
+                # Количество под любым из двух заголовков: пустые ячейки отклоняются
+                # при чтении, а не превращаются в NaN и мусорные целые
+                'Кол-во': 'int32',
+                'Количество': 'int32'
+            }
+        )
+        # read_excel возвращает новый датафрейм — копия не нужна
+        df.rename(columns={'Кол-во': 'Количество'}, inplace=True)
+        df['Тип формы'] = self._cast_form_types(df['Тип формы'])
+        df['width_mm'] = self._meters_to_mm(df['Ширина, м'])
+        df['length_mm'] = self._meters_to_mm(df['Длина, м'])
         
-        logger.info(f"Загружено из XLSX: {len(result)} позиций")
-        return result
+        logger.info(f"Загружено из XLSX: {len(df)} позиций")
+        return df
     
     def assign_cutoffs(self, df: pd.DataFrame) -> pd.DataFrame:
         """
-        Назначение отсечек
+        Назначение отсечек и расчёт производных колонок
+        
+        Строки сортируются по (Тип формы, width_mm) и по убыванию длины,
+        поэтому первая строка каждой отсечки — самая длинная; ей
+        назначается тип отсечки 0. При изменении сортировки это
+        допущение нужно пересмотреть.
         
         Args:
-            df: Входной датафрейм
+            df: Входной датафрейм (результат parse_txt_file или parse_xlsx_file)
             
         Returns:
-            DataFrame: Датафрейм с отсечками
+            DataFrame: Датафрейм с отсечками и расчётами
         """
         logger.info("Назначение отсечек")
         df = df.sort_values(
             ['Тип формы', 'width_mm', 'Длина, м'],
             ascending=[True, True, False]
-        )
+        ).reset_index(drop=True)
         
-        new_rows = []
-        cutoff_counter = 1
+        # После сортировки группы (Тип формы, ширина) идут подряд —
+        # достаточно найти границы серий, без группировки
+        form_types = df['Тип формы'].to_numpy()
+        widths = df['width_mm'].to_numpy()
+        group_starts = np.empty(len(df), dtype=np.bool_)
+        group_starts[:1] = True
+        group_starts[1:] = (form_types[1:] != form_types[:-1]) | (widths[1:] != widths[:-1])
         
-        for (form_type, width_mm), group in df.groupby(['Тип формы', 'width_mm']):
-            group = group.copy().reset_index(drop=True)
-            capacity = self.FORM_CAPACITY[form_type]
-            cutoff_type = self.CUTOFF_TYPES[form_type]
-            
-            subgroups = []
-            current_subgroup = []
-            current_total = 0
-            
-            for _, row in group.iterrows():
-                count = int(row['Количество'])
-                if current_total + count > capacity:
-                    if current_subgroup:
-                        subgroups.append(current_subgroup)
-                    current_subgroup = [row]
-                    current_total = count
-                else:
-                    current_subgroup.append(row)
-                    current_total += count
-            
-            if current_subgroup:
-                subgroups.append(current_subgroup)
-            
-            for subgroup in subgroups:
-                max_length_idx = max(
-                    range(len(subgroup)),
-                    key=lambda i: subgroup[i]['Длина, м']
-                )
-                for i, row in enumerate(subgroup):
-                    row_dict = row.to_dict()
-                    row_dict['Отсечка'] = cutoff_counter
-                    row_dict['Тип отсечки'] = 0 if i == max_length_idx else cutoff_type
-                    new_rows.append(row_dict)
-                cutoff_counter += 1
+        # Вместимость и тип отсечки для каждой строки — индексация по таблицам
+        # (типы форм уже проверены при парсинге в _cast_form_types)
+        capacities = self._CAP_LUT[form_types]
+        cutoff_types = self._CUT_LUT[form_types]
         
-        result_df = pd.DataFrame(new_rows)
-        logger.info(f"Создано отсечек: {cutoff_counter - 1}")
-        return result_df.drop(['width_mm', 'length_mm'], axis=1, errors='ignore')
-    
-    def calculate_derived_columns(self, df: pd.DataFrame) -> pd.DataFrame:
-        """
-        Расчёт производных колонок
+        count = df['Количество'].to_numpy().astype(np.int64)
         
-        Args:
-            df: Входной датафрейм
-            
-        Returns:
-            DataFrame: Датафрейм с расчётами
-        """
-        logger.info("Расчёт производных колонок")
-        df['Развертка, м'] = round(df['Ширина, м'] * df['Длина, м'], 2)
-        df['Общая площадь, м'] = round(df['Развертка, м'] * df['Количество'], 2)
-        df['Площадь проекции, м'] = round(
-            df['Длина, м'] * df['Проекция, м'] * df['Количество'], 2
+        # Самая длинная строка отсечки — первая (см. сортировку выше)
+        cutoff_ids, is_first = _pack_subgroups(
+            group_starts,
+            count,
+            capacities.astype(np.int64)
         )
-        return df
+        
+        # Производные колонки считаются в том же проходе
+        width = df['Ширина, м'].to_numpy(dtype=np.float64)
+        length = df['Длина, м'].to_numpy(dtype=np.float64)
+        projection = df['Проекция, м'].to_numpy(dtype=np.float64)
+        unfolding = np.round(width * length, 2)
+        
+        # Новые колонки к отсортированному датафрейму за один шаг
+        result = df.drop(['width_mm', 'length_mm'], axis=1, errors='ignore').assign(**{
+            'Развертка, м': unfolding,
+            'Общая площадь, м': np.round(unfolding * count, 2),
+            'Площадь проекции, м': np.round(length * projection * count, 2),
+            'Отсечка': cutoff_ids,
+            'Тип отсечки': np.where(is_first, 0, cutoff_types.astype(np.int64))
+        })
+        
+        logger.info(f"Создано отсечек: {int(cutoff_ids[-1]) if len(cutoff_ids) else 0}")
+        return result
     
     def reorder_columns(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -212,12 +305,8 @@ class CalculatorService:
         Returns:
             DataFrame: Датафрейм с упорядоченными колонками
         """
-        return df[[
-            'Наименование изделия', 'Ед. изм.', 'Количество', 'Ширина, м', 'Длина, м',
-            'Развертка, м', 'Общая площадь, м',
-            'Проекция, м', 'Площадь проекции, м',
-            'Тип формы', 'Отсечка', 'Тип отсечки'
-        ]]
+        # С Copy-on-Write (pandas 3) выборка колонок не копирует данные
+        return df[RESULT_COLUMNS]
     
     async def process_file(self, file_path: Path, file_extension: str, content: Union[str, None] = None) -> pd.DataFrame:
         """
@@ -226,7 +315,7 @@ class CalculatorService:
         Args:
             file_path: Путь к файлу
             file_extension: Расширение файла (.txt или .xlsx)
-            content: Содержимое TXT файла (опционально)
+            content: Содержимое TXT файла (опционально, иначе читается из file_path)
             
         Returns:
             DataFrame: Обработанный датафрейм
@@ -236,7 +325,7 @@ class CalculatorService:
         try:
             if file_extension == '.txt':
                 if content is None:
-                    raise ValueError("Для TXT файла требуется содержимое")
+                    content = file_path.read_text(encoding='utf-8')
                 df = self.parse_txt_file(content)
             elif file_extension == '.xlsx':
                 df = self.parse_xlsx_file(file_path)
@@ -244,7 +333,6 @@ class CalculatorService:
                 raise ValueError(f"Неподдерживаемое расширение: {file_extension}")
             
             df = self.assign_cutoffs(df)
-            df = self.calculate_derived_columns(df)
             df = self.reorder_columns(df)
             
             logger.info("Обработка файла завершена успешно")
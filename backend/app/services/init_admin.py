@@ -2,7 +2,7 @@ from sqlalchemy import select
 import logging
 from app.core.config import settings
 from app.core.database import AsyncSessionLocal
-from app.core.security import get_password_hash
+from app.core.security import aget_password_hash
 from app.models.models import User, UserRole
 
 logger = logging.getLogger(__name__)
@@ -14,17 +14,17 @@ async def init_default_admin():
     """
     async with AsyncSessionLocal() as db:
         try:
-            # Проверка существования админа
+            # Проверка существования админа (без загрузки ORM-объекта)
             result = await db.execute(
-                select(User).where(User.username == settings.ADMIN_USERNAME)
+                select(User.id).where(User.username == settings.ADMIN_USERNAME).limit(1)
             )
-            admin = result.scalar_one_or_none()
+            admin_id = result.scalar_one_or_none()
             
-            if not admin:
+            if admin_id is None:
                 # Создание админа
                 admin = User(
                     username=settings.ADMIN_USERNAME,
-                    hashed_password=get_password_hash(settings.ADMIN_PASSWORD),
+                    hashed_password=await aget_password_hash(settings.ADMIN_PASSWORD),
                     role=UserRole.ADMIN
                 )
                 db.add(admin)
@@ -2,7 +2,8 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from datetime import datetime, timedelta
 from pathlib import Path
-from sqlalchemy import select
+from sqlalchemy import select, delete
+import asyncio
 import logging
 from app.core.config import settings
 from app.core.database import AsyncSessionLocal
@@ -13,6 +14,16 @@ logger = logging.getLogger(__name__)
 scheduler = AsyncIOScheduler()
 
 
+def _unlink_if_exists(file_path: str) -> None:
+    """
+    Удаление файла с диска, если он существует
+    
+    Args:
+        file_path: Путь к файлу
+    """
+    Path(file_path).unlink(missing_ok=True)
+
+
 async def cleanup_old_files():
     """
     Удаление файлов старше FILE_RETENTION_DAYS дней
@@ -24,23 +35,24 @@ async def cleanup_old_files():
             # Вычисление даты отсечки
             cutoff_date = datetime.utcnow() - timedelta(days=settings.FILE_RETENTION_DAYS)
             
-            # Поиск файлов для удаления
+            # Поиск файлов для удаления (только пути, без загрузки ORM-объектов;
+            # запрос целиком покрывается индексом ix_calc_files_cleanup)
             result = await db.execute(
-                select(CalculationFile).where(CalculationFile.created_at < cutoff_date)
+                select(CalculationFile.file_path).where(CalculationFile.created_at < cutoff_date)
             )
-            old_files = result.scalars().all()
+            file_paths = result.scalars().all()
+            
+            # Параллельное удаление файлов с диска в пуле потоков
+            await asyncio.gather(*(
+                asyncio.to_thread(_unlink_if_exists, file_path)
+                for file_path in file_paths
+            ))
             
-            deleted_count = 0
-            for calc_file in old_files:
-                # Удаление файла с диска
-                file_path = Path(calc_file.file_path)
-                if file_path.exists():
-                    file_path.unlink()
-                    logger.info(f"Удалён файл: {calc_file.filename}")
-                
-                # Удаление из БД
-                await db.delete(calc_file)
-                deleted_count += 1
+            # Удаление из БД одним запросом
+            result = await db.execute(
+                delete(CalculationFile).where(CalculationFile.created_at < cutoff_date)
+            )
+            deleted_count = result.rowcount
             
             await db.commit()
             